@@ -5,11 +5,57 @@ Loads exceptions with status='CLOSED' and remarks into ChromaDB for similarity s
 """
 
 import csv
+import hashlib
+import json
 import os
 import yaml
 from pathlib import Path
 from vector_store import ExceptionVectorStore
 
+# Stores the fingerprint of the last ingested CSV inside the persist directory
+INGEST_META_FILE = "ingest_meta.json"
+
+# Records read from the CSV and embedded per add_exceptions_batch call
+INGEST_BATCH_SIZE = 256
+
+
+def iter_closed_exception_batches(
+    csv_path: str = "data/exceptions.csv",
+    batch_size: int = INGEST_BATCH_SIZE
+):
+    """
+    Stream CLOSED exceptions from CSV in batches.
+
+    Args:
+        csv_path: Path to exceptions CSV file
+        batch_size: Maximum records per batch
+
+    Yields:
+        Lists of up to batch_size CLOSED exception records
+    """
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return
+
+        # Filter on raw rows; only build dicts for the rows we keep
+        status_idx = header.index('status')
+        remarks_idx = header.index('remarks')
+        min_len = max(status_idx, remarks_idx) + 1
+
+        batch = []
+        for row in reader:
+            # Only load CLOSED exceptions with remarks
+            if len(row) >= min_len and row[status_idx] == 'CLOSED' and row[remarks_idx]:
+                batch.append(dict(zip(header, row)))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+
+        if batch:
+            yield batch
+
 
 def load_closed_exceptions(csv_path: str = "data/exceptions.csv"):
     """
@@ -21,16 +67,50 @@ def load_closed_exceptions(csv_path: str = "data/exceptions.csv"):
     Returns:
         List of CLOSED exception records
     """
-    closed_exceptions = []
+    return [
+        record
+        for batch in iter_closed_exception_batches(csv_path)
+        for record in batch
+    ]
 
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # Only load CLOSED exceptions with remarks
-            if row.get('status') == 'CLOSED' and row.get('remarks'):
-                closed_exceptions.append(row)
 
-    return closed_exceptions
+def csv_fingerprint(csv_path: str, embedding_deployment: str) -> str:
+    """
+    Fingerprint CSV contents so unchanged files can skip re-ingestion.
+
+    The embedding deployment is part of the fingerprint, so switching
+    models in config.yaml re-ingests even if the CSV is unchanged.
+
+    Args:
+        csv_path: Path to exceptions CSV file
+        embedding_deployment: Embedding deployment the vectors come from
+
+    Returns:
+        Hex digest of the deployment name and file contents
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(embedding_deployment.encode('utf-8') + b'\0')
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_ingest_fingerprint(persist_directory: str) -> str:
+    """Return the fingerprint recorded by the last ingest, or None."""
+    meta_path = Path(persist_directory) / INGEST_META_FILE
+    if not meta_path.exists():
+        return None
+
+    with open(meta_path, 'r') as f:
+        return json.load(f).get('csv_fingerprint')
+
+
+def write_ingest_fingerprint(persist_directory: str, fingerprint: str) -> None:
+    """Record the fingerprint of the CSV that was just ingested."""
+    meta_path = Path(persist_directory) / INGEST_META_FILE
+    with open(meta_path, 'w') as f:
+        json.dump({'csv_fingerprint': fingerprint}, f)
 
 
 def get_config_value(config_value: str, env_fallback: str = None) -> str:
@@ -52,14 +132,19 @@ def get_config_value(config_value: str, env_fallback: str = None) -> str:
 
 def ingest_to_vector_db(
     csv_path: str = "data/exceptions.csv",
-    persist_directory: str = "./chromadb_data"
+    persist_directory: str = "./chromadb_data",
+    force: bool = False
 ):
     """
     Ingest CLOSED exceptions into vector database.
 
+    Skipped when the CSV and embedding deployment are unchanged since the
+    last ingest, unless force is set.
+
     Args:
         csv_path: Path to exceptions CSV
         persist_directory: ChromaDB persist directory
+        force: Re-ingest even if the CSV is unchanged
     """
     # Load config from config.yaml
     config_file = Path(__file__).parent / "config.yaml"
@@ -101,19 +186,27 @@ def ingest_to_vector_db(
         persist_directory=persist_directory
     )
 
-    print(f"\nLoading CLOSED exceptions from {csv_path}...")
-    closed_exceptions = load_closed_exceptions(csv_path)
+    fingerprint = csv_fingerprint(csv_path, embedding_deployment)
+    if (not force and vector_store.count() > 0
+            and read_ingest_fingerprint(persist_directory) == fingerprint):
+        print(f"\n✅ {csv_path} and embedding deployment unchanged since last ingest, skipping (use --force to re-ingest)")
+        print(f"   Total records in vector DB: {vector_store.count()}")
+        return
+
+    print(f"\nIngesting CLOSED exceptions from {csv_path} in batches of {INGEST_BATCH_SIZE}...")
+    print("This will take a few moments (generating embeddings)...")
 
-    print(f"Found {len(closed_exceptions)} CLOSED exceptions with remarks")
+    count = 0
+    for batch in iter_closed_exception_batches(csv_path):
+        print(f"\nIngesting batch of {len(batch)} CLOSED exceptions with remarks "
+              f"(ingested so far: {count})")
+        count += vector_store.add_exceptions_batch(batch)
 
-    if not closed_exceptions:
+    if count == 0:
         print("❌ No CLOSED exceptions found. Nothing to ingest.")
         return
 
-    print("\nIngesting into vector database...")
-    print("This will take a few moments (generating embeddings)...")
-
-    count = vector_store.add_exceptions_batch(closed_exceptions)
+    write_ingest_fingerprint(persist_directory, fingerprint)
 
     print(f"\n✅ Successfully ingested {count} exceptions into vector database")
     print(f"   Vector store location: {persist_directory}")
@@ -128,7 +221,8 @@ def ingest_to_vector_db(
 
 def clear_vector_db(persist_directory: str = "./chromadb_data"):
     """
-    Clear all data from vector database.
+    Clear all data from vector database, the query embedding cache and the
+    ingest fingerprint.
 
     Args:
         persist_directory: ChromaDB persist directory
@@ -149,6 +243,12 @@ def clear_vector_db(persist_directory: str = "./chromadb_data"):
 
     print(f"Clearing vector database at {persist_directory}...")
     vector_store.clear()
+    vector_store.clear_query_cache()
+
+    meta_path = Path(persist_directory) / INGEST_META_FILE
+    if meta_path.exists():
+        meta_path.unlink()
+
     print("✅ Vector database cleared")
 
 
@@ -158,4 +258,4 @@ if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--clear":
         clear_vector_db()
     else:
-        ingest_to_vector_db()
+        ingest_to_vector_db(force="--force" in sys.argv[1:])
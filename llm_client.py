@@ -5,9 +5,54 @@ No classes, no wrappers - just direct HTTP requests using requests library.
 """
 
 import requests
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 
+# One HTTP session per thread so connections (TCP + TLS) are reused across calls
+_thread_local = threading.local()
+
+
+# Shared worker pools for batched embedding requests, keyed by size. Workers
+# (and their sessions) outlive a single call so connections stay warm.
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Return the shared thread pool with max_workers threads, creating it on first use."""
+    with _executors_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="embeddings"
+            )
+            _executors[max_workers] = executor
+        return executor
+
+
+class ServiceUnavailableError(Exception):
+    """The API could not be reached: connection error, timeout, 5xx or rate limited."""
+
+
+def _is_unavailable(error: requests.exceptions.RequestException) -> bool:
+    """True if a request error means the service is down rather than the request bad."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, 'response', None)
+    return response is not None and (response.status_code >= 500 or response.status_code == 429)
+
+
+def _get_session() -> requests.Session:
+    """Return the calling thread's HTTP session, creating it on first use."""
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
 
 def _make_request(
     method: str,
@@ -32,11 +77,13 @@ def _make_request(
         Response JSON
 
     Raises:
-        Exception: If request fails after retries
+        ServiceUnavailableError: If the service stays unreachable, failing
+            (5xx) or rate limited after retries
+        Exception: If the request fails after retries for another reason
     """
     for attempt in range(max_retries):
         try:
-            response = requests.request(
+            response = _get_session().request(
                 method=method,
                 url=url,
                 headers=headers,
@@ -50,7 +97,7 @@ def _make_request(
             # Handle rate limiting
             if response.status_code == 429:
                 retry_after = int(response.headers.get('Retry-After', 5))
-                print(f"Rate limited. Retrying after {retry_after}s...")
+                print(f"Rate limited. Retrying after {retry_after}s...", file=sys.stderr)
                 time.sleep(retry_after)
                 continue
 
@@ -60,20 +107,21 @@ def _make_request(
         except requests.exceptions.Timeout:
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt
-                print(f"Timeout. Retrying in {wait_time}s...")
+                print(f"Timeout. Retrying in {wait_time}s...", file=sys.stderr)
                 time.sleep(wait_time)
             else:
-                raise Exception(f"Request timed out after {max_retries} attempts")
+                raise ServiceUnavailableError(f"Request timed out after {max_retries} attempts")
 
         except requests.exceptions.RequestException as e:
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt
-                print(f"Request failed: {e}. Retrying in {wait_time}s...")
+                print(f"Request failed: {e}. Retrying in {wait_time}s...", file=sys.stderr)
                 time.sleep(wait_time)
             else:
-                raise Exception(f"Request failed after {max_retries} attempts: {e}")
+                error_class = ServiceUnavailableError if _is_unavailable(e) else Exception
+                raise error_class(f"Request failed after {max_retries} attempts: {e}") from e
 
-    raise Exception("Max retries exceeded")
+    raise ServiceUnavailableError("Max retries exceeded (rate limited)")
 
 
 def call_chat_completion(
@@ -180,6 +228,65 @@ def generate_embedding(
     return result["data"][0]["embedding"]
 
 
+def generate_embeddings_batch(
+    endpoint: str,
+    api_key: str,
+    api_version: str,
+    deployment: str,
+    texts: List[str],
+    batch_size: int = 16,
+    max_workers: int = 4
+) -> List[List[float]]:
+    """
+    Generate embeddings for many texts, several texts per request.
+
+    The embeddings API accepts an array input, so N texts take
+    ceil(N / batch_size) requests instead of N. Up to max_workers requests
+    are in flight at once; rate limiting (429) is retried per request.
+
+    Args:
+        endpoint: Azure OpenAI endpoint URL
+        api_key: API key for authentication
+        api_version: API version
+        deployment: Embedding deployment name (e.g., "text-embedding-ada-002")
+        texts: Texts to embed
+        batch_size: Texts per request (Azure limits ada-002 to 16 on older API versions)
+        max_workers: Maximum concurrent requests
+
+    Returns:
+        Embedding vectors, in the same order as texts
+    """
+    endpoint = endpoint.rstrip('/')
+    url = (
+        f"{endpoint}/openai/deployments/{deployment}"
+        f"/embeddings?api-version={api_version}"
+    )
+
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": api_key
+    }
+
+    def embed_chunk(chunk: List[str]) -> List[List[float]]:
+        payload = {
+            "input": chunk
+        }
+
+        result = _make_request("POST", url, headers, payload)
+        # Items carry their input index; don't rely on response order
+        data = sorted(result["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    chunks = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    if len(chunks) <= 1 or max_workers <= 1:
+        results = map(embed_chunk, chunks)
+    else:
+        # map() preserves chunk order regardless of completion order
+        results = list(_get_executor(max_workers).map(embed_chunk, chunks))
+
+    return [embedding for chunk_embeddings in results for embedding in chunk_embeddings]
+
+
 def analyze_exception(
     endpoint: str,
     api_key: str,
@@ -6,10 +6,12 @@ MCP server with AI-powered exception analysis tools.
 
 import asyncio
 import csv
+import functools
 import os
+import re
 import yaml
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -23,6 +25,31 @@ PROJECT_ROOT = Path(__file__).parent
 CONFIG_FILE = PROJECT_ROOT / "config.yaml"
 DATA_DIR = PROJECT_ROOT / "data"
 
+# Statement separators and comment markers rejected by validate_sql
+FORBIDDEN_SQL_TOKENS = re.compile(r";|--|/\*")
+
+# Output templates (parsed once, filled per result)
+SIMILAR_CASE_TEMPLATE = (
+    "## Similar Case {index} ({similarity:.1f}% match)\n\n"
+    "**Exception ID:** {exception_id}\n"
+    "**Type:** {exception_type}\n"
+    "**Category:** {exception_category}\n"
+    "**Error:** {error_message}...\n"
+    "**Resolution:** {remarks}\n\n"
+)
+
+RECORD_TEMPLATE = (
+    "Record {index}:\n"
+    "  Exception ID: {exception_id}\n"
+    "  Event ID: {event_id}\n"
+    "  Error: {error_message}...\n"
+    "  Type: {exception_type}\n"
+    "  Category: {exception_category}\n"
+    "  Status: {status}\n"
+    "  Retries: {times_replayed}\n"
+    "\n"
+)
+
 # Global instances
 app = Server("exception-analysis-server")
 vector_store = None
@@ -136,20 +163,26 @@ def get_csv_path() -> Path:
     return DATA_DIR / "exceptions.csv"
 
 
-def load_exceptions_from_csv() -> List[Dict[str, Any]]:
-    """Load all exceptions from CSV."""
+@functools.lru_cache(maxsize=8)
+def _load_exceptions_cached(csv_path: str, mtime_ns: int) -> Tuple[Dict[str, Any], ...]:
+    """Parse the CSV once per (path, modification time)."""
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        return tuple(csv.DictReader(f))
+
+
+def load_exceptions_from_csv() -> Tuple[Dict[str, Any], ...]:
+    """
+    Load all exceptions from CSV.
+
+    The parsed rows are cached until the file's modification time changes.
+    Returns a tuple shared between callers; treat the records as read-only.
+    """
     csv_path = get_csv_path()
 
     if not csv_path.exists():
-        return []
+        return ()
 
-    exceptions = []
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            exceptions.append(row)
-
-    return exceptions
+    return _load_exceptions_cached(str(csv_path), csv_path.stat().st_mtime_ns)
 
 
 def get_exception_by_id(exception_id: str) -> Dict[str, Any]:
@@ -164,7 +197,18 @@ def get_exception_by_id(exception_id: str) -> Dict[str, Any]:
 
 
 def format_schema() -> str:
-    """Format database schema for display."""
+    """
+    Format database schema for display.
+
+    The formatted text is cached until config.yaml's modification time changes.
+    """
+    mtime_ns = CONFIG_FILE.stat().st_mtime_ns if CONFIG_FILE.exists() else None
+    return _format_schema_cached(mtime_ns)
+
+
+@functools.lru_cache(maxsize=4)
+def _format_schema_cached(mtime_ns: Optional[int]) -> str:
+    """Build the schema text once per config.yaml modification time."""
     cfg = load_config()
 
     schema_text = "# Database Schema\n\n"
@@ -199,12 +243,15 @@ def validate_sql(sql: str) -> tuple[bool, str]:
     if not sql_stripped.upper().startswith("SELECT"):
         return False, "Only SELECT queries allowed"
 
+    # Single scan for all forbidden tokens
+    forbidden = set(FORBIDDEN_SQL_TOKENS.findall(sql_stripped))
+
     # No semicolons (prevents statement chaining)
-    if ';' in sql_stripped:
+    if ';' in forbidden:
         return False, "Semicolons not allowed"
 
     # No SQL comments
-    if '--' in sql_stripped or '/*' in sql_stripped:
+    if forbidden:
         return False, "Comments not allowed"
 
     return True, ""
@@ -246,15 +293,16 @@ def execute_query_on_csv(sql: str) -> str:
     result += "=" * 80 + "\n\n"
 
     for i, exc in enumerate(exceptions[:5], 1):
-        result += f"Record {i}:\n"
-        result += f"  Exception ID: {exc.get('exception_id')}\n"
-        result += f"  Event ID: {exc.get('event_id')}\n"
-        result += f"  Error: {exc.get('error_message', '')[:100]}...\n"
-        result += f"  Type: {exc.get('exception_type')}\n"
-        result += f"  Category: {exc.get('exception_category')}\n"
-        result += f"  Status: {exc.get('status')}\n"
-        result += f"  Retries: {exc.get('times_replayed')}\n"
-        result += "\n"
+        result += RECORD_TEMPLATE.format(
+            index=i,
+            exception_id=exc.get('exception_id'),
+            event_id=exc.get('event_id'),
+            error_message=exc.get('error_message', '')[:100],
+            exception_type=exc.get('exception_type'),
+            exception_category=exc.get('exception_category'),
+            status=exc.get('status'),
+            times_replayed=exc.get('times_replayed')
+        )
 
     return result
 
@@ -356,7 +404,13 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             )]
 
         # Find similar
-        similar = vector_store.find_similar(exception_id, exception, top_k=top_k)
+        try:
+            similar = vector_store.find_similar(exception_id, exception, top_k=top_k)
+        except llm_client.ServiceUnavailableError as e:
+            return [TextContent(
+                type="text",
+                text=f"❌ Embedding service unavailable, similarity search skipped: {e}"
+            )]
 
         if not similar:
             return [TextContent(
@@ -370,12 +424,15 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             metadata = sim.get('metadata', {})
             similarity = sim.get('similarity', 0) * 100
 
-            result += f"## Similar Case {i} ({similarity:.1f}% match)\n\n"
-            result += f"**Exception ID:** {sim.get('exception_id')}\n"
-            result += f"**Type:** {metadata.get('exception_type', 'N/A')}\n"
-            result += f"**Category:** {metadata.get('exception_category', 'N/A')}\n"
-            result += f"**Error:** {metadata.get('error_message', 'N/A')[:200]}...\n"
-            result += f"**Resolution:** {metadata.get('remarks', 'No remarks')}\n\n"
+            result += SIMILAR_CASE_TEMPLATE.format(
+                index=i,
+                similarity=similarity,
+                exception_id=sim.get('exception_id'),
+                exception_type=metadata.get('exception_type', 'N/A'),
+                exception_category=metadata.get('exception_category', 'N/A'),
+                error_message=metadata.get('error_message', 'N/A')[:200],
+                remarks=metadata.get('remarks', 'No remarks')
+            )
 
         return [TextContent(type="text", text=result)]
 
@@ -397,8 +454,16 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
                 text=f"❌ Exception not found: {exception_id}"
             )]
 
-        # Find similar cases
-        similar = vector_store.find_similar(exception_id, exception, top_k=3)
+        # Find similar cases (the analysis still runs without them)
+        similar_note = ""
+        try:
+            similar = vector_store.find_similar(exception_id, exception, top_k=3)
+        except llm_client.ServiceUnavailableError as e:
+            similar = []
+            similar_note = (
+                f"⚠️ Embedding service unavailable, analysis generated without "
+                f"similar historical cases: {e}\n\n"
+            )
 
         # Get schema
         schema = format_schema()
@@ -414,7 +479,7 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             schema=schema
         )
 
-        return [TextContent(type="text", text=analysis)]
+        return [TextContent(type="text", text=similar_note + analysis)]
 
     raise ValueError(f"Unknown tool: {name}")
 
@@ -4,8 +4,13 @@ Stack Trace Parser
 Extracts method chains and metadata from Java stack traces.
 """
 
+import functools
+import io
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+# Traces at least this long are parsed without memoization to bound cache memory
+MAX_CACHED_TRACE_CHARS = 50_000
 
 
 class StackTraceParser:
@@ -39,7 +44,32 @@ class StackTraceParser:
                 at com.trading.handler.Handler.handle(Handler.java:23)
             '''
             result = StackTraceParser.parse(trace)
+
+        Results are memoized per (stacktrace, max_depth) for traces shorter
+        than MAX_CACHED_TRACE_CHARS; each call returns fresh lists, so
+        callers may modify the result.
         """
+        if stacktrace and len(stacktrace) >= MAX_CACHED_TRACE_CHARS:
+            return StackTraceParser._parse_trace(stacktrace, max_depth)
+
+        return {
+            key: list(value) if isinstance(value, tuple) else value
+            for key, value in StackTraceParser._parse_cached(stacktrace, max_depth)
+        }
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _parse_cached(stacktrace: str, max_depth: int) -> Tuple[Tuple[str, Any], ...]:
+        """Memoized parse, stored as immutable (key, value) pairs."""
+        result = StackTraceParser._parse_trace(stacktrace, max_depth)
+        return tuple(
+            (key, tuple(value) if isinstance(value, list) else value)
+            for key, value in result.items()
+        )
+
+    @staticmethod
+    def _parse_trace(stacktrace: str, max_depth: int) -> Dict[str, Any]:
+        """Parse a stack trace (uncached); see parse() for the result format."""
         if not stacktrace or not stacktrace.strip():
             return {
                 "error_class": "Unknown",
@@ -51,10 +81,11 @@ class StackTraceParser:
                 "full_methods": []
             }
 
-        lines = stacktrace.strip().split('\n')
+        # Split off the first line; frames are read lazily below
+        first_line, _, frames = stacktrace.strip().partition('\n')
 
         # Extract error class and message from first line
-        first_line = lines[0].strip()
+        first_line = first_line.strip()
         error_class = "Unknown"
         error_message = ""
 
@@ -82,13 +113,17 @@ class StackTraceParser:
             r'\)'                                  # Closing parenthesis
         )
 
-        for line in lines[1:]:  # Skip first line (error message)
+        for line in io.StringIO(frames):
+            # Stop once max_depth frames are collected
+            if len(method_chain) >= max_depth:
+                break
+
             # Stop at "... N more" lines
             if '...' in line and 'more' in line.lower():
                 break
 
             match = stack_pattern.match(line)
-            if match and len(method_chain) < max_depth:
+            if match:
                 full_method = match.group(1)
                 file_name = match.group(2)
                 line_number = match.group(3)
@@ -6,14 +6,15 @@ Shows how the AI-powered exception analysis framework works.
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import csv
 import os
 import yaml
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 import llm_client
-from vector_store import ExceptionVectorStore
 
 # Page config
 st.set_page_config(
@@ -28,6 +29,19 @@ CSV_PATH = DATA_DIR / "exceptions.csv"
 VECTOR_DB_PATH = "./chromadb_data"
 CONFIG_FILE = Path(__file__).parent / "config.yaml"
 
+# Columns shown in the high retry table
+HIGH_RETRY_COLUMNS = [
+    'exception_id', 'event_id', 'error_message',
+    'exception_type', 'exception_category', 'status',
+    'times_replayed', 'source_system'
+]
+
+# Row colors for the high retry table (anything not OPEN is shown as resolved)
+STATUS_CSS = {
+    'OPEN': 'background-color: #ffcccc',
+    'CLOSED': 'background-color: #ccffcc'
+}
+
 
 def get_config_value(config_value: str, env_fallback: str = None) -> str:
     """
@@ -60,8 +74,8 @@ def get_config_value(config_value: str, env_fallback: str = None) -> str:
 
 
 @st.cache_resource
-def initialize_clients():
-    """Initialize AI configuration and vector store."""
+def load_ai_config():
+    """Load AI configuration (cheap, no vector store)."""
     # Load config
     if CONFIG_FILE.exists():
         with open(CONFIG_FILE, 'r') as f:
@@ -88,9 +102,21 @@ def initialize_clients():
         embedding_deployment = 'text-embedding-ada-002'
 
     if not endpoint or not api_key:
-        return None, None, None, None, None, None
+        return None, None, None, None, None
+
+    return endpoint, api_key, api_version, chat_deployment, embedding_deployment
 
-    vector_store = ExceptionVectorStore(
+
+@st.cache_resource
+def get_vector_store():
+    """Open the vector store (only needed by the AI Analysis view)."""
+    if not endpoint or not api_key:
+        return None
+
+    # Imported here so the High Retry view never pays for importing ChromaDB
+    from vector_store import ExceptionVectorStore
+
+    return ExceptionVectorStore(
         endpoint=endpoint,
         api_key=api_key,
         api_version=api_version,
@@ -98,12 +124,16 @@ def initialize_clients():
         persist_directory=VECTOR_DB_PATH
     )
 
-    return endpoint, api_key, api_version, chat_deployment, embedding_deployment, vector_store
+
+@st.cache_data(ttl=300)
+def get_vector_count() -> int:
+    """Number of resolved exceptions in the vector store (refreshed every 5 minutes)."""
+    return get_vector_store().count()
 
 
 @st.cache_data
-def load_exceptions():
-    """Load exceptions from CSV."""
+def load_exceptions(csv_mtime: float):
+    """Load exceptions from CSV (cached per CSV modification time)."""
     if not CSV_PATH.exists():
         return []
 
@@ -116,23 +146,78 @@ def load_exceptions():
     return exceptions
 
 
-# Initialize
-endpoint, api_key, api_version, chat_deployment, embedding_deployment, vector_store = initialize_clients()
-all_exceptions = load_exceptions()
+def get_csv_mtime() -> float:
+    """Modification time of the exceptions CSV (0 if missing), used as cache key."""
+    return CSV_PATH.stat().st_mtime if CSV_PATH.exists() else 0.0
 
-# Title
-st.title("🔍 Exception Analysis Framework")
-st.markdown("**AI-powered exception analysis with vector similarity search**")
 
-# Check if AI is available
-if not endpoint or not api_key:
-    st.warning("⚠️ Azure OpenAI credentials not configured. Edit `config.yaml` and paste your endpoint and API key.")
+@st.cache_data
+def load_exceptions_df(csv_mtime: float) -> pd.DataFrame:
+    """
+    Load exceptions from CSV as a typed DataFrame for the high retry tab.
 
-# Tabs
-tab1, tab2 = st.tabs(["📊 High Retry Exceptions", "🤖 AI Analysis"])
+    Cached per CSV modification time. Repeated strings are stored as
+    categoricals and retry counts as int32.
+    """
+    if not CSV_PATH.exists():
+        return pd.DataFrame()
+
+    return pd.read_csv(
+        CSV_PATH,
+        dtype={
+            'times_replayed': 'int32',
+            'status': 'category',
+            'exception_category': 'category'
+        },
+        keep_default_na=False
+    )
+
+
+@st.cache_data
+def build_exception_options(_exceptions_by_id, csv_mtime: float):
+    """
+    Build dropdown label -> exception_id mapping.
+
+    Cached per CSV modification time; the exceptions dict itself is not
+    hashed (leading underscore).
+    """
+    return {
+        f"{exc['event_id']} - {exc['error_message'][:60]}...": exc_id
+        for exc_id, exc in _exceptions_by_id.items()
+    }
 
-# Tab 1: High Retry Exceptions
-with tab1:
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Background worker shared across reruns and sessions."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="similarity")
+
+
+@st.cache_resource
+def precompute_similar_cases(_vector_store, vector_count: int, csv_mtime: float) -> Future:
+    """
+    Start finding similar resolved exceptions for every exception in one batch.
+
+    Runs on a background thread so the page renders immediately; the
+    Analyze button joins the returned future. Started the first time the
+    AI Analysis view is opened, and cached per vector DB size and CSV
+    modification time, so re-running ingest.py or editing the CSV
+    invalidates it.
+    """
+    return get_executor().submit(
+        _vector_store.find_similar_batch,
+        load_exceptions(csv_mtime),
+        top_k=3
+    )
+
+
+@st.fragment
+def render_high_retry_tab():
+    """
+    Render the High Retry Exceptions tab.
+
+    Runs as a fragment, so moving the slider reruns only this tab.
+    """
     st.header("High Retry Exceptions")
 
     # Filter settings
@@ -146,70 +231,77 @@ with tab1:
         )
 
     # Filter exceptions
-    high_retry = [
-        exc for exc in all_exceptions
-        if int(exc.get('times_replayed', 0)) >= retry_threshold
-    ]
-
-    if not high_retry:
+    exceptions_df = load_exceptions_df(get_csv_mtime())
+    if exceptions_df.empty:
+        df = exceptions_df
+    else:
+        # Only the displayed columns, so styling and serialization skip
+        # trace, payload and the other wide text fields
+        df = exceptions_df.loc[
+            exceptions_df['times_replayed'] >= retry_threshold,
+            HIGH_RETRY_COLUMNS
+        ]
+
+    if df.empty:
         st.info(f"No exceptions with {retry_threshold}+ retries found")
     else:
-        st.success(f"Found **{len(high_retry)}** exceptions")
-
-        # Create DataFrame
-        df = pd.DataFrame(high_retry)
+        st.success(f"Found **{len(df)}** exceptions")
 
         # Display metrics
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.metric("Total", len(df))
         with col2:
-            avg_retries = df['times_replayed'].astype(int).mean()
+            avg_retries = df['times_replayed'].mean()
             st.metric("Avg Retries", f"{avg_retries:.1f}")
         with col3:
-            open_count = len(df[df['status'] == 'OPEN'])
+            open_count = int((df['status'] == 'OPEN').sum())
             st.metric("Open", open_count)
         with col4:
-            closed_count = len(df[df['status'] == 'CLOSED'])
+            closed_count = int((df['status'] == 'CLOSED').sum())
             st.metric("Closed", closed_count)
 
         st.markdown("---")
 
         # Display table
-        display_df = df[[
-            'exception_id', 'event_id', 'error_message',
-            'exception_type', 'exception_category', 'status',
-            'times_replayed', 'source_system'
-        ]].copy()
-
-        display_df['times_replayed'] = display_df['times_replayed'].astype(int)
-
         # Color coding
         def highlight_status(row):
-            if row['status'] == 'OPEN':
-                return ['background-color: #ffcccc'] * len(row)
-            return ['background-color: #ccffcc'] * len(row)
+            return [STATUS_CSS.get(row['status'], STATUS_CSS['CLOSED'])] * len(row)
 
         st.dataframe(
-            display_df.style.apply(highlight_status, axis=1),
+            df.style.apply(highlight_status, axis=1),
+            column_order=HIGH_RETRY_COLUMNS,
+            column_config={
+                'times_replayed': st.column_config.NumberColumn(format='%d')
+            },
             use_container_width=True,
             height=400
         )
 
-# Tab 2: AI Analysis
-with tab2:
+
+def render_ai_analysis_tab():
+    """
+    Render the AI Analysis tab.
+
+    Opens the vector store and starts the similar-case batch, so it only
+    runs while this view is selected.
+    """
     st.header("🤖 AI-Powered Exception Analysis")
 
+    vector_store = get_vector_store()
+
     if not endpoint or not api_key or not vector_store:
         st.error("❌ AI configuration not initialized. Edit `config.yaml` with your Azure OpenAI credentials and refresh page.")
     else:
         # Vector DB stats
-        vector_count = vector_store.count()
+        vector_count = get_vector_count()
         if vector_count == 0:
             st.warning(f"⚠️ Vector database is empty. Run `python ingest.py` to load resolved exceptions.")
         else:
             st.info(f"📊 Vector database contains {vector_count} resolved exceptions")
 
+            similar_future = precompute_similar_cases(vector_store, vector_count, get_csv_mtime())
+
         st.markdown("---")
 
         # Select exception
@@ -217,10 +309,10 @@ with tab2:
             st.error("No exceptions found in CSV")
         else:
             # Create dropdown options
-            exception_options = {
-                f"{exc['event_id']} - {exc['error_message'][:60]}...": exc['exception_id']
-                for exc in all_exceptions
-            }
+            exception_options = build_exception_options(
+                exceptions_by_id,
+                get_csv_mtime()
+            )
 
             selected_label = st.selectbox(
                 "Select an exception to analyze:",
@@ -231,10 +323,7 @@ with tab2:
                 exception_id = exception_options[selected_label]
 
                 # Find the exception
-                selected_exception = next(
-                    exc for exc in all_exceptions
-                    if exc['exception_id'] == exception_id
-                )
+                selected_exception = exceptions_by_id[exception_id]
 
                 # Display exception details
                 st.markdown("### 📋 Exception Details")
@@ -350,12 +439,15 @@ with tab2:
                         st.markdown("---")
 
                         with st.spinner("🔍 Finding similar exceptions..."):
-                            # Find similar
-                            similar = vector_store.find_similar(
-                                exception_id,
-                                selected_exception,
-                                top_k=3
-                            )
+                            # Usually already finished in the background
+                            try:
+                                similar_cases = similar_future.result()
+                            except Exception:
+                                # Don't keep a failed batch cached
+                                precompute_similar_cases.clear()
+                                raise
+
+                        similar = similar_cases.get(str(exception_id), [])
 
                         with st.spinner("🤖 Generating AI-powered resolution..."):
                             # Get schema
@@ -385,11 +477,20 @@ with tab2:
                         # Citations section
                         if similar:
                             st.markdown("### 📚 Citations - Similar Historical Cases")
-                            st.caption("The AI analysis above is based on the following resolved exceptions:")
+                            # Similarity percentages, computed once for all citations
+                            similarities = np.fromiter(
+                                (sim.get('similarity', 0) for sim in similar),
+                                dtype=np.float32,
+                                count=len(similar)
+                            ) * 100.0
+
+                            st.caption(
+                                "The AI analysis above is based on the following resolved exceptions "
+                                f"(best match {similarities.max():.1f}%, average {similarities.mean():.1f}%):"
+                            )
 
-                            for i, sim in enumerate(similar, 1):
+                            for i, (sim, similarity) in enumerate(zip(similar, similarities), 1):
                                 metadata = sim.get('metadata', {})
-                                similarity = sim.get('similarity', 0) * 100
 
                                 with st.expander(f"📖 Citation [{i}] - {similarity:.1f}% similarity match", expanded=False):
                                     col1, col2 = st.columns(2)
@@ -414,6 +515,35 @@ with tab2:
                         else:
                             st.warning("⚠️ No similar historical cases found. The AI analysis above is based on general exception patterns and best practices.")
 
+
+# Initialize
+endpoint, api_key, api_version, chat_deployment, embedding_deployment = load_ai_config()
+all_exceptions = load_exceptions(get_csv_mtime())
+exceptions_by_id = {exc['exception_id']: exc for exc in all_exceptions}
+
+# Title
+st.title("🔍 Exception Analysis Framework")
+st.markdown("**AI-powered exception analysis with vector similarity search**")
+
+# Check if AI is available
+if not endpoint or not api_key:
+    st.warning("⚠️ Azure OpenAI credentials not configured. Edit `config.yaml` and paste your endpoint and API key.")
+
+# Views. Unlike st.tabs, which runs every tab's body on each rerun, only the
+# selected view runs, so viewing High Retry Exceptions never opens the vector
+# store or starts the similar-case batch.
+VIEWS = {
+    "📊 High Retry Exceptions": render_high_retry_tab,
+    "🤖 AI Analysis": render_ai_analysis_tab
+}
+selected_view = st.radio(
+    "View",
+    options=list(VIEWS),
+    horizontal=True,
+    label_visibility="collapsed"
+)
+VIEWS[selected_view]()
+
 # Footer
 st.sidebar.markdown("---")
 st.sidebar.markdown("""
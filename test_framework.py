@@ -15,6 +15,13 @@ RED = '\033[91m'
 YELLOW = '\033[93m'
 RESET = '\033[0m'
 
+# Expected config sections and CSV columns
+REQUIRED_CONFIG_KEYS = frozenset({'project', 'database', 'azure_openai', 'vector_db', 'schema'})
+REQUIRED_CSV_FIELDS = frozenset({
+    'exception_id', 'error_message', 'exception_type',
+    'exception_category', 'status', 'trace'
+})
+
 
 def print_test(name, passed, message=""):
     """Print test result."""
@@ -43,9 +50,18 @@ def test_file_structure():
         "data/exceptions.csv"
     ]
 
+    # One directory listing per directory instead of one stat() per file
+    existing = set()
+    for directory in {str(Path(file_path).parent) for file_path in required_files}:
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as entries:
+            prefix = "" if directory == "." else f"{directory}/"
+            existing.update(f"{prefix}{entry.name}" for entry in entries)
+
     all_exist = True
     for file_path in required_files:
-        exists = Path(file_path).exists()
+        exists = file_path in existing
         print_test(f"File exists: {file_path}", exists)
         all_exist = all_exist and exists
 
@@ -64,12 +80,11 @@ def test_config_loading():
             config = yaml.safe_load(f)
 
         # Check required keys
-        required_keys = ['project', 'database', 'azure_openai', 'vector_db', 'schema']
-        all_keys_present = all(key in config for key in required_keys)
+        all_keys_present = REQUIRED_CONFIG_KEYS <= config.keys()
 
         print_test("Config file loads", True)
         print_test("Required keys present", all_keys_present,
-                  f"Keys: {', '.join(required_keys)}")
+                  f"Keys: {', '.join(sorted(REQUIRED_CONFIG_KEYS))}")
 
         # Check schema
         has_schema = 'trade_ingestion_exception' in config['schema']
@@ -96,14 +111,29 @@ def test_csv_data():
             print_test("CSV file exists", False)
             return False
 
+        # Stream the file once with plain rows and column indices
+        total_count = closed_count = open_count = with_remarks = 0
         with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-
-        total_count = len(rows)
-        closed_count = sum(1 for row in rows if row.get('status') == 'CLOSED')
-        open_count = sum(1 for row in rows if row.get('status') == 'OPEN')
-        with_remarks = sum(1 for row in rows if row.get('remarks'))
+            reader = csv.reader(f)
+            header = next(reader, [])
+            columns = {name: i for i, name in enumerate(header)}
+            status_idx = columns.get('status')
+            remarks_idx = columns.get('remarks')
+            min_len = max(idx for idx in (status_idx, remarks_idx, 0) if idx is not None) + 1
+
+            for row in reader:
+                # Skip blank lines (DictReader ignores them) and truncated rows
+                if len(row) < min_len:
+                    continue
+                total_count += 1
+
+                status = row[status_idx] if status_idx is not None else None
+                if status == 'CLOSED':
+                    closed_count += 1
+                elif status == 'OPEN':
+                    open_count += 1
+                if remarks_idx is not None and row[remarks_idx]:
+                    with_remarks += 1
 
         print_test("CSV file loads", True, f"{total_count} records")
         print_test("Has CLOSED exceptions", closed_count > 0, f"{closed_count} CLOSED")
@@ -111,16 +141,10 @@ def test_csv_data():
         print_test("Has remarks", with_remarks > 0, f"{with_remarks} with remarks")
 
         # Check required fields
-        required_fields = [
-            'exception_id', 'error_message', 'exception_type',
-            'exception_category', 'status', 'trace'
-        ]
-
-        if rows:
-            first_row = rows[0]
-            all_fields = all(field in first_row for field in required_fields)
+        if total_count:
+            all_fields = REQUIRED_CSV_FIELDS <= columns.keys()
             print_test("Required fields present", all_fields,
-                      f"Fields: {', '.join(required_fields)}")
+                      f"Fields: {', '.join(sorted(REQUIRED_CSV_FIELDS))}")
         else:
             print_test("CSV has data", False)
             return False
@@ -155,7 +179,12 @@ def test_stacktrace_parser():
         print_test("Identifies entry point", result['entry_point'] is not None,
                   f"Entry: {result['entry_point']}")
 
-        return True
+        # Memoized results must not leak caller modifications
+        result['method_chain'].append('Mutated.method')
+        cached_ok = StackTraceParser.parse(trace)['method_chain'] == result['method_chain'][:-1]
+        print_test("Cached results are independent", cached_ok)
+
+        return cached_ok
 
     except Exception as e:
         print_test("Stacktrace parser", False, str(e))
@@ -229,6 +258,83 @@ def test_vector_store_structure():
         return False
 
 
+def test_vector_store_queue():
+    """Test the add_exception write-behind queue (stubbed embeddings, temp DB)."""
+    print("\n" + "=" * 80)
+    print("TEST: Vector Store Write Queue")
+    print("=" * 80)
+
+    import hashlib
+    import shutil
+    import tempfile
+    import llm_client
+
+    def fake_request(method, url, headers, json_data, timeout=60, max_retries=3):
+        texts = json_data['input']
+        texts = [texts] if isinstance(texts, str) else texts
+        return {'data': [
+            {'index': i, 'embedding': [b / 255.0 for b in hashlib.md5(text.encode()).digest()[:8]]}
+            for i, text in enumerate(texts)
+        ]}
+
+    original_request = llm_client._make_request
+    llm_client._make_request = fake_request
+    persist_directory = tempfile.mkdtemp()
+
+    try:
+        from vector_store import ExceptionVectorStore
+
+        store = ExceptionVectorStore(
+            endpoint="https://example.invalid/",
+            api_key="test",
+            api_version="test",
+            embedding_deployment="test",
+            persist_directory=persist_directory
+        )
+        store.flush_size = 3
+
+        def record(n, remarks):
+            return {
+                'error_message': f'Error {n}',
+                'exception_type': 'java.lang.RuntimeException',
+                'exception_category': 'TEST',
+                'trace': f'java.lang.RuntimeException\n\tat com.test.Service.call{n}(Service.java:{n})',
+                'remarks': remarks
+            }
+
+        # Same ID twice: one queued record, the last one wins
+        store.add_exception('DUP', record(1, 'first'))
+        store.add_exception('DUP', record(1, 'second'))
+        deduped = len(store._pending) == 1 and store.collection.count() == 0
+        print_test("Queued duplicate IDs are deduped", deduped)
+
+        # Third distinct record reaches flush_size and writes the batch
+        store.add_exception('A', record(2, 'a'))
+        store.add_exception('B', record(3, 'b'))
+        stored = store.collection.get(ids=['DUP'], include=['metadatas'])
+        flushed = (
+            store.collection.count() == 3
+            and not store._pending
+            and stored['metadatas'][0].get('remarks') == 'second'
+        )
+        print_test("Flushes at flush_size", flushed, f"{store.collection.count()} stored")
+
+        # count() writes pending records before counting
+        store.add_exception('C', record(4, 'c'))
+        counted = store.collection.count() == 3 and store.count() == 4
+        print_test("count() flushes first", counted)
+
+        return deduped and flushed and counted
+
+    except Exception as e:
+        print_test("Vector store write queue", False, str(e))
+        return False
+
+    finally:
+        llm_client._make_request = original_request
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
 def test_environment_variables():
     """Test environment variables."""
     print("\n" + "=" * 80)
@@ -267,6 +373,7 @@ def run_all_tests():
     results['stacktrace_parser'] = test_stacktrace_parser()
     results['llm_client_structure'] = test_llm_client_structure()
     results['vector_store_structure'] = test_vector_store_structure()
+    results['vector_store_queue'] = test_vector_store_queue()
     results['environment_variables'] = test_environment_variables()
 
     # Summary
@@ -274,7 +381,7 @@ def run_all_tests():
     print("TEST SUMMARY")
     print("=" * 80)
 
-    passed = sum(1 for v in results.values() if v)
+    passed = sum(results.values())
     total = len(results)
 
     for test_name, result in results.items():
@@ -5,11 +5,172 @@ Uses ChromaDB with Azure OpenAI embeddings for finding similar exceptions.
 """
 
 import chromadb
+import hashlib
+import numpy as np
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from stacktrace_parser import StackTraceParser
 import llm_client
 
+# Collections up to this size are searched with an exact in-memory scan;
+# for small N a single matrix product beats the HNSW index overhead.
+EXACT_SEARCH_MAX_ROWS = 5000
+
+# ChromaDB's SQLite file under persist_directory; its modification time tells
+# the in-memory copy (see _load_matrix) that another process wrote
+CHROMA_DB_FILE = "chroma.sqlite3"
+
+# Query embeddings are cached in memory and in this file under persist_directory.
+# The file keeps at most QUERY_CACHE_DISK_SIZE entries (oldest written are
+# dropped first); a 1536-dim embedding takes about 12 KB.
+QUERY_CACHE_FILE = "embed_cache.sqlite"
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_DISK_SIZE = 20000
+
+# Metadata for newly created collections. Cosine distance makes
+# similarity (1 - distance) the cosine similarity; existing collections keep
+# the space they were created with (see _query_matrix).
+COLLECTION_METADATA = {
+    "description": "Resolved exceptions for similarity search",
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": 200,
+}
+
+# add_exception() queues records and writes them through add_exceptions_batch()
+# once this many are pending (or on flush()/close())
+ADD_FLUSH_SIZE = 32
+
+# After the embedding endpoint is found unavailable, similarity searches against
+# it fail fast for this many seconds instead of retrying on every call
+EMBED_FAILURE_TTL = 5.0
+_embed_failures: Dict[str, float] = {}  # endpoint -> time.monotonic() of last failure
+
+# Only this much of a trace is parsed for metadata; the first frames (all that
+# method_chain keeps) fit comfortably, the rest of a long trace is skipped
+MAX_METADATA_TRACE_CHARS = 8192
+
+# Record fields copied verbatim (as strings) into ChromaDB metadata when set
+_STR_FIELDS = (
+    'exception_type',
+    'exception_category',
+    'exception_sub_category',
+    'source_system',
+    'raising_system',
+    'event_id',
+    'remarks',
+    'error_message',
+)
+
+
+class QueryEmbeddingCache:
+    """LRU cache of query embeddings, written through to SQLite so it survives restarts."""
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = QUERY_CACHE_SIZE,
+        max_disk_entries: int = QUERY_CACHE_DISK_SIZE
+    ):
+        """
+        Open (or create) the cache.
+
+        Args:
+            path: SQLite file path
+            maxsize: Maximum entries kept in memory
+            max_disk_entries: Maximum entries kept in the SQLite file
+        """
+        self.maxsize = maxsize
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, embedding BLOB)"
+        )
+        self._conn.commit()
+        # Upper bound on rows in the table (replacing a key counts as a new row)
+        self._disk_entries = self._conn.execute(
+            "SELECT COUNT(*) FROM query_embeddings"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(deployment: str, text: str) -> str:
+        """Cache key for a text embedded by a given deployment."""
+        return hashlib.sha1(f"{deployment}\n{text}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return the cached embedding, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT embedding FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            embedding = array('d', row[0]).tolist()
+            self._remember(key, embedding)
+            return embedding
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        """Store an embedding in memory and on disk."""
+        self.put_many([(key, embedding)])
+
+    def put_many(self, items: List[Tuple[str, List[float]]]) -> None:
+        """Store several embeddings with a single write and commit."""
+        if not items:
+            return
+
+        with self._lock:
+            for key, embedding in items:
+                self._remember(key, embedding)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, embedding) VALUES (?, ?)",
+                [(key, array('d', embedding).tobytes()) for key, embedding in items]
+            )
+            self._disk_entries += len(items)
+            if self._disk_entries > self.max_disk_entries:
+                self._trim_disk()
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove all cached embeddings, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM query_embeddings")
+            self._conn.commit()
+            self._disk_entries = 0
+
+    def _trim_disk(self) -> None:
+        """Drop the oldest written rows beyond max_disk_entries (lock held)."""
+        self._disk_entries = self._conn.execute(
+            "SELECT COUNT(*) FROM query_embeddings"
+        ).fetchone()[0]
+        excess = self._disk_entries - self.max_disk_entries
+        if excess > 0:
+            # INSERT OR REPLACE assigns a new rowid, so rowid order is write order
+            self._conn.execute(
+                "DELETE FROM query_embeddings WHERE rowid IN "
+                "(SELECT rowid FROM query_embeddings ORDER BY rowid LIMIT ?)",
+                (excess,)
+            )
+            self._disk_entries = self.max_disk_entries
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
 
 class ExceptionVectorStore:
     """Vector store for exception similarity search using ChromaDB."""
@@ -48,9 +209,23 @@ class ExceptionVectorStore:
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            metadata={"description": "Resolved exceptions for similarity search"}
+            metadata=COLLECTION_METADATA
         )
 
+        # In-memory copy of the collection for exact search (see _load_matrix)
+        self._matrix = None
+
+        # Per-category where filters for ChromaDB queries (see _query)
+        self._where_cache: Dict[str, Dict[str, str]] = {}
+
+        # Query embeddings cache (see embed_record)
+        self._query_cache = QueryEmbeddingCache(str(Path(persist_directory) / QUERY_CACHE_FILE))
+
+        # Write-behind queue for add_exception (see flush)
+        self._pending: Dict[str, Dict[str, Any]] = {}  # exception_id -> record
+        self._pending_lock = threading.RLock()
+        self.flush_size = ADD_FLUSH_SIZE
+
     def _prepare_text_for_embedding(self, record: Dict[str, Any]) -> str:
         """
         Combine relevant fields into text for embedding.
@@ -61,64 +236,122 @@ class ExceptionVectorStore:
         Returns:
             Combined text for embedding
         """
+        error_message = record.get('error_message')
+        exception_type = record.get('exception_type')
+        trace = record.get('trace')
+
+        # Common case: all three fields present, built in one step
+        if error_message and exception_type and trace:
+            return f"Error: {error_message}\nType: {exception_type}\nTrace: {trace}"
+
         parts = []
 
         # Error message (important)
-        if record.get('error_message'):
-            parts.append(f"Error: {record['error_message']}")
+        if error_message:
+            parts.append(f"Error: {error_message}")
 
         # Exception type (important)
-        if record.get('exception_type'):
-            parts.append(f"Type: {record['exception_type']}")
+        if exception_type:
+            parts.append(f"Type: {exception_type}")
 
         # Stack trace (most important for similarity)
-        if record.get('trace'):
-            parts.append(f"Trace: {record['trace']}")
+        if trace:
+            parts.append(f"Trace: {trace}")
 
         return "\n".join(parts)
 
-    def _prepare_metadata(self, record: Dict[str, Any]) -> Dict[str, Any]:
+    def embed_record(self, record: Dict[str, Any]) -> List[float]:
         """
-        Prepare metadata for ChromaDB (no None values allowed).
+        Generate the query embedding for an exception record.
+
+        Callers can compute this once and pass it to find_similar() as
+        query_embedding to skip re-embedding on repeated searches.
+        Results are cached (see QueryEmbeddingCache), so repeated queries for
+        the same text skip the API call.
 
         Args:
             record: Exception record
 
         Returns:
-            Cleaned metadata dict
+            Embedding vector (list of floats)
         """
-        # Parse stacktrace to get method chain
-        trace = record.get('trace', '')
-        parsed = StackTraceParser.parse(trace)
+        return self._embed_queries([self._prepare_text_for_embedding(record)])[0]
+
+    def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed query texts, serving repeats from the query embedding cache.
+
+        Args:
+            texts: Query texts
+
+        Returns:
+            Embedding vectors, in the same order as texts
+        """
+        keys = [QueryEmbeddingCache.make_key(self.embedding_deployment, text) for text in texts]
+        embeddings = [self._query_cache.get(key) for key in keys]
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        generated = self._embed_texts([texts[i] for i in missing])
+        for i, embedding in zip(missing, generated):
+            embeddings[i] = embedding
+
+        # One write for the batch; placeholder (all-zero) vectors are not cached
+        self._query_cache.put_many([
+            (keys[i], embeddings[i]) for i in missing if any(embeddings[i])
+        ])
+
+        return embeddings
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for many texts using batched API requests.
+
+        Identical texts are embedded once and the vector is shared.
+
+        Args:
+            texts: Texts to embed
 
-        metadata = {}
+        Returns:
+            Embedding vectors, in the same order as texts
+        """
+        if not texts:
+            return []
 
-        # Basic fields
-        if record.get('exception_type'):
-            metadata['exception_type'] = str(record['exception_type'])
+        unique_texts = list(dict.fromkeys(texts))
+        unique_embeddings = llm_client.generate_embeddings_batch(
+            endpoint=self.endpoint,
+            api_key=self.api_key,
+            api_version=self.api_version,
+            deployment=self.embedding_deployment,
+            texts=unique_texts
+        )
 
-        if record.get('exception_category'):
-            metadata['exception_category'] = str(record['exception_category'])
+        embedding_by_text = dict(zip(unique_texts, unique_embeddings))
+        return [embedding_by_text[text] for text in texts]
 
-        if record.get('exception_sub_category'):
-            metadata['exception_sub_category'] = str(record['exception_sub_category'])
+    def _prepare_metadata(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Prepare metadata for ChromaDB (no None values allowed).
 
-        if record.get('source_system'):
-            metadata['source_system'] = str(record['source_system'])
+        Args:
+            record: Exception record
 
-        if record.get('raising_system'):
-            metadata['raising_system'] = str(record['raising_system'])
+        Returns:
+            Cleaned metadata dict
+        """
+        # Parse stacktrace to get method chain
+        trace = (record.get('trace') or '')[:MAX_METADATA_TRACE_CHARS]
+        parsed = StackTraceParser.parse(trace)
 
-        if record.get('event_id'):
-            metadata['event_id'] = str(record['event_id'])
+        # Basic fields, remarks (resolution) and error message
+        metadata = {k: str(v) for k in _STR_FIELDS if (v := record.get(k))}
 
-        # Remarks (resolution) - important!
-        if record.get('remarks'):
-            metadata['remarks'] = str(record['remarks'])
+        # Which model produced the stored vector (see _get_stored_embeddings)
+        metadata['embedding_deployment'] = self.embedding_deployment
 
         # Error message (truncated)
-        if record.get('error_message'):
-            metadata['error_message'] = str(record['error_message'])[:500]
+        if 'error_message' in metadata:
+            metadata['error_message'] = metadata['error_message'][:500]
 
         # Parsed stacktrace info
         if parsed['entry_point']:
@@ -127,46 +360,64 @@ class ExceptionVectorStore:
         if parsed['package_root']:
             metadata['package_root'] = str(parsed['package_root'])
 
-        # Method chain as comma-separated string
-        if parsed['method_chain']:
-            metadata['method_chain'] = ','.join(parsed['method_chain'][:10])
-
-        # Call signature
+        # Method chain as comma-separated string, plus call signature.
+        # Frames repeat heavily across exceptions, so names and the joined
+        # strings are interned to share one copy per distinct value.
         if parsed['method_chain']:
-            metadata['call_signature'] = '->'.join(parsed['method_chain'][:5])
+            chain = [sys.intern(method) for method in parsed['method_chain'][:10]]
+            metadata['method_chain'] = sys.intern(','.join(chain))
+            metadata['call_signature'] = sys.intern('->'.join(chain[:5]))
 
         return metadata
 
     def add_exception(self, exception_id: str, record: Dict[str, Any]) -> None:
         """
-        Add exception to vector store.
+        Queue an exception for the vector store.
+
+        The write is deferred: queued records are written in one batch (see
+        flush) once flush_size are pending, before any count or search, and
+        on flush(), close() or leaving a ``with`` block. Call one of those
+        before the process exits, or queued records are lost. Adding an ID
+        that is already queued replaces the queued record.
 
         Args:
             exception_id: Unique exception ID
             record: Exception record with fields
         """
-        # Prepare text for embedding
-        text = self._prepare_text_for_embedding(record)
+        with self._pending_lock:
+            exception_id = str(exception_id)
+            self._pending.pop(exception_id, None)
+            self._pending[exception_id] = {**record, 'exception_id': exception_id}
 
-        # Generate embedding using simple request/response call
-        embedding = llm_client.generate_embedding(
-            endpoint=self.endpoint,
-            api_key=self.api_key,
-            api_version=self.api_version,
-            deployment=self.embedding_deployment,
-            text=text
-        )
+            if len(self._pending) >= self.flush_size:
+                self.flush()
 
-        # Prepare metadata
-        metadata = self._prepare_metadata(record)
+    def flush(self) -> int:
+        """
+        Write queued add_exception() records to the vector store.
 
-        # Add to ChromaDB
-        self.collection.add(
-            ids=[exception_id],
-            embeddings=[embedding],
-            documents=[text],
-            metadatas=[metadata]
-        )
+        Records stay queued if the write fails, so a later flush retries them.
+
+        Returns:
+            Number of records written
+        """
+        with self._pending_lock:
+            if not self._pending:
+                return 0
+
+            added = self.add_exceptions_batch(list(self._pending.values()))
+            self._pending = {}
+            return added
+
+    def close(self) -> None:
+        """Flush any queued records."""
+        self.flush()
+
+    def __enter__(self) -> "ExceptionVectorStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
 
     def add_exceptions_batch(self, records: List[Dict[str, Any]]) -> int:
         """
@@ -194,36 +445,69 @@ class ExceptionVectorStore:
             texts.append(self._prepare_text_for_embedding(record))
             metadatas.append(self._prepare_metadata(record))
 
-        # Generate embeddings one by one
-        print(f"Generating embeddings for {len(texts)} exceptions...")
-        embeddings = []
-        for text in texts:
-            embedding = llm_client.generate_embedding(
-                endpoint=self.endpoint,
-                api_key=self.api_key,
-                api_version=self.api_version,
-                deployment=self.embedding_deployment,
-                text=text
-            )
-            embeddings.append(embedding)
-
-        # Add to ChromaDB
+        # Reuse embeddings already stored for records whose text is unchanged
+        stored = self._get_stored_embeddings(ids, texts)
+        if stored:
+            print(f"Reusing stored embeddings for {len(stored)} unchanged exceptions...")
+
+        # Generate the missing embeddings in batched requests
+        missing = [text for exception_id, text in zip(ids, texts) if exception_id not in stored]
+        print(f"Generating embeddings for {len(missing)} exceptions...")
+        generated = iter(self._embed_texts(missing))
+        embeddings = [
+            stored[exception_id] if exception_id in stored else next(generated)
+            for exception_id in ids
+        ]
+
+        # Add to ChromaDB (upsert so changed records replace their old version)
         print(f"Adding {len(ids)} exceptions to vector store...")
-        self.collection.add(
+        self.collection.upsert(
             ids=ids,
             embeddings=embeddings,
             documents=texts,
             metadatas=metadatas
         )
+        self._matrix = None
 
         return len(ids)
 
+    def _get_stored_embeddings(self, ids: List[str], texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up embeddings already persisted for these IDs.
+
+        Only entries whose stored document matches the new text and that were
+        embedded by this store's embedding_deployment are returned, so edited
+        records, and records embedded by another model, are re-embedded.
+
+        Args:
+            ids: Exception IDs about to be added
+            texts: Embedding texts, parallel to ids
+
+        Returns:
+            Dict mapping exception_id to its stored embedding
+        """
+        existing = self.collection.get(ids=ids, include=['documents', 'embeddings', 'metadatas'])
+        if not existing['ids']:
+            return {}
+
+        text_by_id = dict(zip(ids, texts))
+        return {
+            exception_id: [float(x) for x in embedding]
+            for exception_id, document, embedding, metadata in zip(
+                existing['ids'], existing['documents'],
+                existing['embeddings'], existing['metadatas']
+            )
+            if document == text_by_id.get(exception_id)
+            and (metadata or {}).get('embedding_deployment') == self.embedding_deployment
+        }
+
     def find_similar(
         self,
         exception_id: str,
         exception_record: Dict[str, Any],
         top_k: int = 3,
-        filter_category: bool = True
+        filter_category: bool = True,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Find similar exceptions using vector similarity.
@@ -233,74 +517,324 @@ class ExceptionVectorStore:
             exception_record: The exception record
             top_k: Number of similar cases to return
             filter_category: Filter by same exception_category
+            query_embedding: Precomputed embedding (see embed_record); skips
+                the embedding API call when provided
 
         Returns:
             List of similar exceptions with metadata and similarity scores
+
+        Raises:
+            llm_client.ServiceUnavailableError: If the embedding endpoint is
+                unavailable (ChromaDB is not queried)
         """
-        # Prepare text for embedding
-        text = self._prepare_text_for_embedding(exception_record)
+        embedding = query_embedding
+        if embedding is None:
+            embedding = self._embed_query_record(exception_record)
 
-        # Generate embedding using simple request/response call
-        embedding = llm_client.generate_embedding(
-            endpoint=self.endpoint,
-            api_key=self.api_key,
-            api_version=self.api_version,
-            deployment=self.embedding_deployment,
-            text=text
-        )
+        # Placeholder vector: nothing meaningful to search for
+        if not embedding or not any(embedding):
+            return []
 
-        # Build where filter
-        where_filter = None
-        if filter_category and exception_record.get('exception_category'):
-            where_filter = {
-                "exception_category": exception_record['exception_category']
-            }
+        category = exception_record.get('exception_category') if filter_category else None
 
-        # Query ChromaDB
-        results = self.collection.query(
-            query_embeddings=[embedding],
+        results = self._query(
+            [embedding],
             n_results=top_k + 1,  # +1 because it might include itself
-            where=where_filter
+            category=category
         )
 
-        # Format results
-        similar = []
-        if results and results['ids'] and len(results['ids'][0]) > 0:
-            for i in range(len(results['ids'][0])):
-                result_id = results['ids'][0][i]
+        return self._format_results(results, 0, exception_id, top_k)
+
+    def _embed_query_record(self, record: Dict[str, Any]) -> List[float]:
+        """
+        Embed a query record, failing fast while the endpoint is unavailable.
+
+        An outage (see llm_client.ServiceUnavailableError) is remembered per
+        endpoint for EMBED_FAILURE_TTL seconds, so a burst of searches during
+        it doesn't repeat the retries. Other errors, e.g. a request rejected
+        for its input, propagate without marking the endpoint down.
+
+        Args:
+            record: Exception record
+
+        Returns:
+            Embedding vector
 
-                # Skip if it's the same exception
-                if result_id == str(exception_id):
-                    continue
+        Raises:
+            llm_client.ServiceUnavailableError: If the endpoint is unavailable
+        """
+        failed_at = _embed_failures.get(self.endpoint)
+        if failed_at is not None and time.monotonic() - failed_at < EMBED_FAILURE_TTL:
+            raise llm_client.ServiceUnavailableError(
+                "Embedding service unavailable (recent failure); skipping similarity search"
+            )
 
-                # Calculate similarity (1 - distance)
-                distance = results['distances'][0][i]
-                similarity = 1 - distance
+        try:
+            return self.embed_record(record)
+        except llm_client.ServiceUnavailableError as e:
+            _embed_failures[self.endpoint] = time.monotonic()
+            print(f"Warning: Embedding service unavailable, skipping similarity search: {e}",
+                  file=sys.stderr)
+            raise
 
-                similar.append({
-                    'exception_id': result_id,
-                    'distance': distance,
-                    'similarity': similarity,
-                    'metadata': results['metadatas'][0][i],
-                    'document': results['documents'][0][i] if results.get('documents') else None
-                })
+    def find_similar_batch(
+        self,
+        records: List[Dict[str, Any]],
+        top_k: int = 3,
+        filter_category: bool = True
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Find similar exceptions for many records at once.
 
-                if len(similar) >= top_k:
-                    break
+        Records are grouped by exception_category (when filtering) so each
+        group is answered by a single ChromaDB query instead of one query
+        per record.
 
-        return similar
+        Args:
+            records: Exception records (must have 'exception_id' field)
+            top_k: Number of similar cases to return per record
+            filter_category: Filter by same exception_category
+
+        Returns:
+            Dict mapping exception_id to its list of similar exceptions
+        """
+        groups: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for record in records:
+            if not record.get('exception_id'):
+                continue
+            category = record.get('exception_category') if filter_category else None
+            groups.setdefault(category or None, []).append(record)
+
+        similar_by_id = {}
+        for category, group in groups.items():
+            embeddings = self._embed_queries(
+                [self._prepare_text_for_embedding(record) for record in group]
+            )
+
+            results = self._query(
+                embeddings,
+                n_results=top_k + 1,  # +1 because it might include itself
+                category=category
+            )
+
+            for i, record in enumerate(group):
+                exception_id = str(record['exception_id'])
+                similar_by_id[exception_id] = self._format_results(
+                    results, i, exception_id, top_k
+                )
+
+        return similar_by_id
+
+    def _query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        category: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Nearest-neighbour query, optionally restricted to one exception_category.
+
+        Small collections are answered by an exact scan over the in-memory
+        matrix; larger ones go to ChromaDB's index. Both return the
+        collection.query() result layout.
+
+        Args:
+            query_embeddings: Query vectors
+            n_results: Number of neighbours per query
+            category: exception_category to filter on (None for all)
+
+        Returns:
+            Dict with 'ids', 'distances', 'metadatas', 'documents' lists,
+            one inner list per query
+        """
+        self.flush()
+
+        if self._load_matrix():
+            return self._query_matrix(query_embeddings, n_results, category)
+
+        where = None
+        if category:
+            where = self._where_cache.get(category)
+            if where is None:
+                where = self._where_cache[category] = {"exception_category": category}
+
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where
+        )
+
+    def _load_matrix(self) -> bool:
+        """
+        Load (or refresh) the in-memory copy of the collection.
+
+        Writes through this store drop the copy directly. Writes by another
+        process (e.g. ingest.py, including --force upserts that keep the
+        count) are detected by the collection count or the modification
+        time of ChromaDB's SQLite file changing.
+
+        Returns:
+            True if exact search can be used
+        """
+        count = self.collection.count()
+        if count == 0 or count > EXACT_SEARCH_MAX_ROWS:
+            self._matrix = None
+            return False
+
+        # Taken before reading, so a write that lands mid-read triggers a reload
+        version = (count, self._db_mtime_ns())
+        if self._matrix is not None and self._matrix_version == version:
+            return True
+
+        data = self.collection.get(include=['embeddings', 'metadatas', 'documents'])
+        matrix = np.asarray(data['embeddings'], dtype=np.float32)
+
+        self._matrix_ids = data['ids']
+        self._matrix_metadatas = data['metadatas']
+        self._matrix_documents = data['documents']
+
+        # Row indices per exception_category, so filtered queries skip the mask
+        rows_by_category: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(data['metadatas']):
+            category = (metadata or {}).get('exception_category')
+            if category:
+                rows_by_category.setdefault(category, []).append(i)
+        self._matrix_rows_by_category = {
+            category: np.array(rows, dtype=np.intp)
+            for category, rows in rows_by_category.items()
+        }
+        self._matrix_all_rows = np.arange(count)
+
+        self._matrix_space = (self.collection.metadata or {}).get('hnsw:space', 'l2')
+        self._matrix_sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+        self._matrix_version = version
+        self._matrix = matrix
+        return True
+
+    def _db_mtime_ns(self) -> Optional[int]:
+        """Modification time of ChromaDB's SQLite file (None if missing)."""
+        try:
+            return (Path(self.persist_directory) / CHROMA_DB_FILE).stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _query_matrix(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        category: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Exact top-k search over the in-memory matrix.
+
+        Distances follow the collection's hnsw:space (l2, cosine or ip), so
+        results match what ChromaDB's index would return.
+        """
+        rows = self._matrix_all_rows
+        if category:
+            rows = self._matrix_rows_by_category.get(category, rows[:0])
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        candidates = self._matrix[rows]
+        dots = queries @ candidates.T
+
+        if self._matrix_space == 'cosine':
+            # 1 - q.e / (||q|| ||e||)
+            query_norms = np.sqrt(np.einsum('ij,ij->i', queries, queries))
+            candidate_norms = np.sqrt(self._matrix_sq_norms[rows])
+            norms = query_norms[:, None] * candidate_norms[None, :]
+            distances = 1.0 - dots / np.where(norms == 0, 1.0, norms)
+        elif self._matrix_space == 'ip':
+            distances = 1.0 - dots
+        else:
+            # ||q - e||^2 = ||q||^2 + ||e||^2 - 2 q.e, for all queries in one product
+            distances = (
+                np.einsum('ij,ij->i', queries, queries)[:, None]
+                + self._matrix_sq_norms[rows][None, :]
+                - 2.0 * dots
+            )
+
+        k = min(n_results, len(rows))
+        results = {'ids': [], 'distances': [], 'metadatas': [], 'documents': []}
+        for query_distances in distances:
+            if k < len(rows):
+                top = np.argpartition(query_distances, k - 1)[:k]
+            else:
+                top = np.arange(len(rows))
+            top = top[np.argsort(query_distances[top])]
+
+            results['ids'].append([self._matrix_ids[rows[i]] for i in top])
+            results['distances'].append([float(query_distances[i]) for i in top])
+            results['metadatas'].append([self._matrix_metadatas[rows[i]] for i in top])
+            results['documents'].append([self._matrix_documents[rows[i]] for i in top])
+
+        return results
+
+    def _format_results(
+        self,
+        results: Dict[str, Any],
+        query_index: int,
+        exception_id: str,
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Convert one query's ChromaDB results into similar-exception dicts.
+
+        Args:
+            results: Raw result of collection.query()
+            query_index: Index of the query embedding within the results
+            exception_id: ID of the queried exception (excluded from output)
+            top_k: Maximum number of similar cases to return
+
+        Returns:
+            List of similar exceptions with metadata and similarity scores
+        """
+        if not results or not results['ids'] or not results['ids'][query_index]:
+            return []
+
+        # Drop the queried exception itself, keep the first top_k
+        ids = results['ids'][query_index]
+        keep = np.flatnonzero(np.asarray(ids) != str(exception_id))[:top_k]
+
+        # Calculate similarity (1 - distance)
+        distances = np.asarray(results['distances'][query_index], dtype=np.float64)[keep]
+        similarities = 1.0 - distances
+
+        metadatas = results['metadatas'][query_index]
+        documents = results['documents'][query_index] if results.get('documents') else None
+
+        return [
+            {
+                'exception_id': ids[i],
+                'distance': distance,
+                'similarity': similarity,
+                'metadata': metadatas[i],
+                'document': documents[i] if documents is not None else None
+            }
+            for i, distance, similarity in zip(
+                keep.tolist(), distances.tolist(), similarities.tolist()
+            )
+        ]
 
     def count(self) -> int:
         """Get total number of exceptions in vector store."""
+        self.flush()
         return self.collection.count()
 
     def clear(self) -> None:
-        """Clear all exceptions from vector store."""
+        """Clear all exceptions from vector store (including queued ones)."""
+        with self._pending_lock:
+            self._pending = {}
         self.client.delete_collection(self.collection_name)
         self.collection = self.client.get_or_create_collection(
             name=self.collection_name,
-            metadata={"description": "Resolved exceptions for similarity search"}
+            metadata=COLLECTION_METADATA
         )
+        self._matrix = None
+
+    def clear_query_cache(self) -> None:
+        """Remove all cached query embeddings (see QueryEmbeddingCache)."""
+        self._query_cache.clear()
 
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector store."""